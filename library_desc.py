@@ -23,4 +23,5 @@ class IOModules(cdl_desc.Modules):
     modules += [ CdlModule("ps2_host")]
     modules += [ CdlModule("ps2_host_keyboard")]
     modules += [ CdlModule("uart_minimal")]
+    modules += [ CdlModule("tb_led_seven_segment", src_dir=tb_src_dir)]
     pass
@@ -15,6 +15,45 @@
 # limitations under the License.
 #
 
+#a Imports
+import os
+import re
+import functools
+from typing import List
+
 #a Structures
 t_led_ws2812_data    = {"valid":1, "last":1, "red":8, "green":8, "blue":8}
 t_led_ws2812_request = {"ready":1, "first":1, "led_number":8}
+
+#a Seven segment
+#f read_led_seven_seg_hex - read the per-segment constants from led.h
+def read_led_seven_seg_hex(filename:str) -> List[int]:
+    """
+    Read the led_seven_seg_hex_<segment> constants from led.h, returning
+    them in segment order 'a' to 'g'; bit 'n' of the constant for a
+    segment is set if that segment is lit for hex value 'n'
+    """
+    constants = {}
+    with open(filename) as f:
+        for (segment, value) in re.findall(r"constant\s+bit\[16\]\s+led_seven_seg_hex_([a-g])\s*=\s*16b_([01_]+)", f.read()):
+            constants[segment] = int(value.replace("_",""), 2)
+            pass
+        pass
+    return [constants[s] for s in "abcdefg"]
+
+#f led_seven_seg_hex - per-segment constants from led.h, read on first use
+@functools.lru_cache(maxsize=None)
+def led_seven_seg_hex() -> List[int]:
+    return read_led_seven_seg_hex(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "cdl", "led.h"))
+
+#f led_seven_segment - model of the led_seven_segment module
+def led_seven_segment(hex:int) -> int:
+    """
+    Return the 7-bit LED output for a hex value, with segment 'a' in bit 0
+    """
+    segment_consts = led_seven_seg_hex()
+    leds = 0
+    for i in range(len(segment_consts)):
+        leds |= ((segment_consts[i] >> (hex & 0xf)) & 1) << i
+        pass
+    return leds
@@ -0,0 +1,178 @@
+#a Copyright
+#
+#  This file 'led_golden.py' copyright Gavin J Stark 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#a Imports
+import os
+import sys
+import struct
+import zlib
+from array import array
+from typing import List, Optional, Tuple
+
+#a Support functions
+#f first_difference
+def first_difference(a:bytes, b:bytes) -> int:
+    """
+    Return the index of the first byte that differs between a and b
+    (or the length of the shorter if one is a prefix of the other).
+
+    This bisects using slice comparisons, so it does not loop in
+    Python over every byte.
+    """
+    l = min(len(a), len(b))
+    lo = 0
+    hi = l
+    while lo<hi:
+        mid = (lo+hi)//2
+        if a[lo:mid+1]==b[lo:mid+1]:
+            lo = mid+1
+            pass
+        else:
+            hi = mid
+            pass
+        pass
+    return lo
+
+#a Classes
+#c LedFrames
+class LedFrames(object):
+    """
+    Decoded frames of an LED chain; for each frame the cycle at which
+    the chain loaded, and the (red, green, blue) of every LED in the
+    chain in order, held in flat arrays.
+    """
+    #f __init__
+    def __init__(self, chain_length:int):
+        self.chain_length = chain_length
+        self.cycles = array("Q")
+        self.rgb    = array("B")
+        pass
+    #f add
+    def add(self, cycle:int, rgbs:List[Tuple[int,int,int]]) -> None:
+        self.cycles.append(cycle)
+        for (r,g,b) in rgbs:
+            self.rgb.extend((r,g,b))
+            pass
+        pass
+    #f num_frames
+    def num_frames(self) -> int:
+        return len(self.cycles)
+    #f frame_rgb
+    def frame_rgb(self, frame:int, led:int) -> Tuple[int,int,int]:
+        i = 3*(frame*self.chain_length+led)
+        return (self.rgb[i], self.rgb[i+1], self.rgb[i+2])
+    #f to_bytes
+    def to_bytes(self) -> bytes:
+        cycles = array("Q", self.cycles)
+        if sys.byteorder!="little": cycles.byteswap()
+        return cycles.tobytes() + self.rgb.tobytes()
+    #f from_bytes
+    @classmethod
+    def from_bytes(cls, chain_length:int, num_frames:int, data:bytes) -> "LedFrames":
+        frames = cls(chain_length)
+        frames.cycles.frombytes(data[:8*num_frames])
+        if sys.byteorder!="little": frames.cycles.byteswap()
+        frames.rgb.frombytes(data[8*num_frames:])
+        return frames
+    #f diff
+    def diff(self, actual:"LedFrames") -> List[str]:
+        """
+        Compare actual frames against these (expected) frames; return a
+        list of reasons for mismatch (empty if they match)
+        """
+        errors = []
+        if self.chain_length!=actual.chain_length:
+            errors.append("Chain length mismatch, expected %d got %d"%(self.chain_length, actual.chain_length))
+            return errors
+        if self.num_frames()!=actual.num_frames():
+            errors.append("Number of frames mismatch, expected %d got %d"%(self.num_frames(), actual.num_frames()))
+            pass
+        if self.rgb!=actual.rgb:
+            i = first_difference(self.rgb.tobytes(), actual.rgb.tobytes())
+            (frame, led) = divmod(i//3, self.chain_length)
+            if frame<min(self.num_frames(), actual.num_frames()):
+                errors.append("First mismatch at frame %d LED %d, expected %s got %s"%(frame, led, str(self.frame_rgb(frame,led)), str(actual.frame_rgb(frame,led))))
+                pass
+            pass
+        if self.cycles!=actual.cycles:
+            n = min(self.num_frames(), actual.num_frames())
+            drifts = [actual.cycles[i]-self.cycles[i] for i in range(n)]
+            first = next((i for i in range(n) if drifts[i]!=0), None)
+            if first is not None:
+                max_drift = max(drifts, key=abs)
+                errors.append("Load cycle drift from frame %d (expected cycle %d got %d), maximum drift %d cycles"%(first, self.cycles[first], actual.cycles[first], max_drift))
+                pass
+            pass
+        return errors
+    pass
+
+#c GoldenFrameStore
+class GoldenFrameStore(object):
+    """
+    Store of golden LED frames, one zlib-compressed file per test name.
+
+    Each file holds the hash of the content (stimulus and configuration)
+    that produced it, so that a golden recorded for different content
+    is reported rather than compared.
+    """
+    magic  = b"LEDF"
+    header = struct.Struct("<4sII20s")
+    suffix = ".ledf"
+    #f __init__
+    def __init__(self, directory:str, record:bool=False):
+        self.directory = directory
+        self.record = record
+        pass
+    #f filename
+    def filename(self, name:str) -> str:
+        return os.path.join(self.directory, name+self.suffix)
+    #f save
+    def save(self, name:str, content_hash:str, frames:LedFrames) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        data = self.header.pack(self.magic, frames.chain_length, frames.num_frames(), bytes.fromhex(content_hash))
+        data += frames.to_bytes()
+        with open(self.filename(name),"wb") as f:
+            f.write(zlib.compress(data, 9))
+            pass
+        pass
+    #f load
+    def load(self, name:str) -> Optional[Tuple[str, LedFrames]]:
+        filename = self.filename(name)
+        if not os.path.exists(filename): return None
+        with open(filename,"rb") as f:
+            data = zlib.decompress(f.read())
+            pass
+        (magic, chain_length, num_frames, content_hash) = self.header.unpack_from(data)
+        if magic!=self.magic: raise Exception("File '%s' is not a golden LED frame file"%filename)
+        return (content_hash.hex(), LedFrames.from_bytes(chain_length, num_frames, data[self.header.size:]))
+    #f check
+    def check(self, name:str, content_hash:str, frames:LedFrames) -> List[str]:
+        """
+        Compare frames against the golden for the name, returning a list
+        of errors; if recording, record the frames instead
+        """
+        if self.record:
+            self.save(name, content_hash, frames)
+            return []
+        golden = self.load(name)
+        if golden is None:
+            return ["No golden '%s' in '%s' - record it"%(name, self.directory)]
+        (golden_hash, golden_frames) = golden
+        if golden_hash!=content_hash:
+            return ["Golden '%s' was recorded for different content (hash %s, now %s) - rerecord it"%(name, golden_hash, content_hash)]
+        return golden_frames.diff(frames)
+    pass
@@ -15,12 +15,16 @@
 from regress.apb.structs import t_apb_request, t_apb_response
 from regress.apb.bfm     import ApbMaster
 from regress.io.led import t_led_ws2812_data, t_led_ws2812_request
+from regress.io.led import led_seven_segment
+from regress.io.led_golden import LedFrames, GoldenFrameStore
 from regress.io.target_led_ws2812 import LedWs2812AddressMap
 from cdl.utils   import csr
 from cdl.sim     import ThExecFile, LogEventParser
 from cdl.sim     import HardwareThDut
 from cdl.sim     import TestCase
 from typing import Optional
+import os
+import hashlib
 
 #a WS2812 classes
 #c Ws2812Led
@@ -72,9 +76,9 @@ class Ws2812LedChain(object):
     def shift(self, data_in):
         return self.leds[0].shift(data_in)
     #f load - load the whole chain
-    def load(self):
+    def load(self, cycle):
         for l in self.leds: l.load()
-        self.loaded(self.leds)
+        self.loaded(self.leds, cycle)
         pass
     #f wait_for_low
     def wait_for_low(self, cycle, data, cycles_to_wait_for):
@@ -95,7 +99,7 @@ class Ws2812LedChain(object):
         if data is None: data = self.data_in
         errors = []
         if (self.data_in==0) and ((cycle-self.last_falling_cycle)>self.cycles_to_load):
-            if self.load_pending: self.load()
+            if self.load_pending: self.load(self.last_falling_cycle+self.cycles_to_load)
             self.load_pending = False
             pass
         if data==self.data_in: return errors
@@ -126,12 +130,73 @@ class Ws2812LedChain(object):
         self.first_edge = False
         return errors
     pass
+#a Golden frame support
+#f golden_store
+def golden_store() -> GoldenFrameStore:
+    """
+    Store of golden frames in test/golden (or LED_GOLDEN_DIR), recording
+    if LED_GOLDEN_RECORD is set in the environment
+    """
+    golden_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "golden")
+    return GoldenFrameStore(directory=os.environ.get("LED_GOLDEN_DIR",golden_dir),
+                            record="LED_GOLDEN_RECORD" in os.environ)
+
+#f golden_name
+def golden_name(case, apb:bool) -> str:
+    """
+    Name of the golden frames for a test case; the hardware is
+    distinguished by whether the LEDs are driven over APB
+    """
+    if apb: return "apb_"+case.__name__
+    return case.__name__
+
+#f golden_tests
+def golden_tests(name, case, cycles, apb:bool):
+    """
+    Return the '_tests' entry for a golden frame test case if its golden
+    has been recorded (or is being recorded), else no entries
+    """
+    store = golden_store()
+    if store.record or os.path.exists(store.filename(golden_name(case, apb))):
+        return {name:(case, cycles, {})}
+    return {}
+
+#c LedRampAnimation
+class LedRampAnimation(object):
+    """
+    Frames of a ramp animation, generated as they are driven; its repr
+    is its parameters, so that the content hash of a golden does not
+    require the frames themselves
+    """
+    def __init__(self, num_frames:int, chain_length:int):
+        self.num_frames = num_frames
+        self.chain_length = chain_length
+        pass
+    def __len__(self) -> int:
+        return self.num_frames
+    def __iter__(self):
+        for i in range(self.num_frames):
+            frame = []
+            for j in range(self.chain_length):
+                r = (4*i + 32*j) & 0xff
+                g = (255 - 4*i) & 0xff
+                b = ((i+j)&7) * 0x24
+                frame.append((r,g,b))
+                pass
+            yield frame
+            pass
+        pass
+    def __repr__(self) -> str:
+        return "LedRampAnimation(%d,%d)"%(self.num_frames, self.chain_length)
+    pass
+
 #a Test classes
 #c LedChainTest_Base
 class LedChainTest_Base(ThExecFile):
     th_name = "LED chain test harness"
     cfg_divider_400ns = 19
     chain_length=8
+    golden_frames = False
     #f exec_init
     def exec_init(self) -> None:
         self.toggle_log_event  = self.log_event("toggle", "n", "arg")
@@ -153,7 +218,7 @@ class LedChainTest_Base(ThExecFile):
         self.led_data__valid.drive(0)
         self.bfm_wait(1)
         self.compare_expected("valid taken away after request",self.led_request__ready.value(),0)
-        self.expected_led_values.append(rgb)
+        if not self.golden_frames: self.expected_led_values.append(rgb)
         pass
     #f drive_leds
     def drive_leds(self, led_values):
@@ -170,7 +235,7 @@ class LedChainTest_Base(ThExecFile):
             (r,g,b)=led_values[i]
             data = ((r&0xff)<<0) | ((g&0xff)<<8) | ((b&0xff)<<16)
             self.apb.write(address=i+self.apb_map.led0.Address(), data=data)
-            self.expected_led_values.append(led_values[i])
+            if not self.golden_frames: self.expected_led_values.append(led_values[i])
             pass
         # Wait until the LED chain is low for a while before waiting for the expected data
         # bfm_cycles_beyond is how much we have waited beyond that point (led chain going high after gap)
@@ -179,18 +244,20 @@ class LedChainTest_Base(ThExecFile):
         self.bfm_wait(3*(100+len(led_values)*24)*(self.cfg_divider_400ns+1) - bfm_cycles_beyond)
         pass
     #f led_chain_loaded
-    def led_chain_loaded(self, leds):
+    def led_chain_loaded(self, leds, cycle):
         if self.ignore_loading: return
         leds_r = leds[:]
         leds_r.reverse()
+        self.frames.add(cycle // self.ticks_per_cycle(), [(l.red,l.green,l.blue) for l in leds_r])
+        if self.golden_frames: return
         for l in leds_r:
             if self.expected_led_values==[]:
-                self.failtest("Unexpected loading of LED value %s"%(str(l)))
+                self.failtest("Unexpected loading of LED value %s in %s"%(str(l), self.case_name))
                 continue
             (r,g,b) = self.expected_led_values.pop(0)
-            self.compare_expected("red of loaded LED",l.red,r)
-            self.compare_expected("green of loaded LED",l.green,g)
-            self.compare_expected("blue of loaded LED",l.blue,b)
+            self.compare_expected("red of loaded LED in %s"%self.case_name,l.red,r)
+            self.compare_expected("green of loaded LED in %s"%self.case_name,l.green,g)
+            self.compare_expected("blue of loaded LED in %s"%self.case_name,l.blue,b)
             pass
         pass
     #f clear_led_chain_log_until_low
@@ -217,7 +284,7 @@ class LedChainTest_Base(ThExecFile):
             e = self.led_chain.data_change(cycle=l.global_cycle, data=l.data)
             if len(e)>0:
                 for s in e:
-                    self.failtest(s)
+                    self.failtest("%s in %s"%(s, self.case_name))
                     pass
                 pass
             pass
@@ -246,16 +313,69 @@ class LedChainTest_Base(ThExecFile):
         self.log_data         = self.log_recorder(self.led_log_module) # Log events from led_ws2812_chain
         self.log_data_parser  = DataLogParser()
         self.bfm_wait(10)
+        self.reset_led_chain_model(self.__class__.__name__)
+        pass
+    #f reset_led_chain_model
+    def reset_led_chain_model(self, case_name:str) -> None:
+        """
+        Start a fresh harness-side model of the LED chain for a test
+        case; the LED chain must be idle
+        """
+        self.case_name        = case_name
         self.led_chain        = Ws2812LedChain(self.chain_length, (1+self.cfg_divider_400ns)*self.ticks_per_cycle(), self.led_chain_loaded)
         self.expected_led_values = []
+        self.frames           = LedFrames(self.chain_length)
         pass
-    #f run
-    def run(self) -> None:
-        for l in self.led_values:
+    #f wait_for_led_chain_idle
+    def wait_for_led_chain_idle(self) -> None:
+        """
+        Wait until the LED chain is between frames, so that a fresh
+        model of the chain can be started; the APB target refreshes
+        the chain continuously, so for that wait for a refresh gap
+        """
+        if hasattr(self, "apb"):
+            self.clear_led_chain_log_until_low(100*self.cfg_divider_400ns)
+            pass
+        else:
+            self.handle_led_chain_log()
+            self.compare_expected("LED chain idle after %s"%self.case_name, self.led_chain.load_pending, False)
+            pass
+        pass
+    #f golden_content_hash
+    def golden_content_hash(self, case) -> str:
+        content = (case.cfg_divider_400ns, case.chain_length, case.led_values)
+        return hashlib.sha1(repr(content).encode()).hexdigest()
+    #f golden_check
+    def golden_check(self, case) -> None:
+        """
+        Compare all the decoded frames of a test case against the golden
+        store (or record them)
+        """
+        errors = golden_store().check(golden_name(case, hasattr(self, "apb")), self.golden_content_hash(case), self.frames)
+        for e in errors:
+            self.failtest("%s in %s"%(e, case.__name__))
+            pass
+        pass
+    #f warm_start_key
+    @classmethod
+    def warm_start_key(cls):
+        """
+        Configuration that the state after run__init depends on; test
+        cases with the same key (and hardware) may share one initialization
+        """
+        return (cls.cfg_divider_400ns, cls.chain_length)
+    #f run_led_values
+    def run_led_values(self, led_values):
+        for l in led_values:
             self.drive_leds(l)
             self.handle_led_chain_log()
             pass
-        self.compare_expected("All LEDs seen", len(self.expected_led_values),0)
+        self.compare_expected("All LEDs seen in %s"%self.case_name, len(self.expected_led_values),0)
+        pass
+    #f run
+    def run(self) -> None:
+        self.run_led_values(self.led_values)
+        if self.golden_frames: self.golden_check(self.__class__)
         pass
     #f run__finalize
     def run__finalize(self) -> None:
@@ -317,6 +437,203 @@ class LedChainTest_3(LedChainTest_Base):
         pass
     pass
 
+#c LedChainTest_4
+class LedChainTest_4(LedChainTest_Base):
+    cfg_divider_400ns = 3
+    chain_length=10
+    led_values = []
+    for i in range(4):
+        led_values.append([])
+        for j in range(10):
+            r = (0x25*i + 0x07*j) & 0xff
+            g = (0x3b*i ^ 0x11*j) & 0xff
+            b = (r+g) & 0xff
+            led_values[-1].append((r,g,b))
+            pass
+        pass
+    pass
+
+#c LedChainTest_5
+class LedChainTest_5(LedChainTest_Base):
+    """
+    Long animation checked only against golden frames (load cycles and
+    RGB), with no expected values held by the harness
+    """
+    cfg_divider_400ns = 2
+    chain_length=8
+    golden_frames = True
+    # Each frame takes about 2.6k cycles (8 LEDs of 24 bits at 3 periods, plus the load gap), or 3.5k over APB
+    led_values = LedRampAnimation(num_frames=256, chain_length=8)
+    pass
+
+#c LedChainTest_WarmStart
+class LedChainTest_WarmStart(LedChainTest_Base):
+    """
+    Run a sequence of test cases that share a warm start key in a
+    single simulation, so that reset and configuration (run__init)
+    are performed once for the whole sequence rather than per case.
+    The DUT continues from the previous case once the chain is idle;
+    the harness-side model of the chain is restarted for each case,
+    each case's golden frames (if any) are checked, and failures are
+    reported against the case.
+
+    Subclasses are created by warm_start_tests, which sets 'cases'.
+    """
+    cases = []
+    #f run
+    def run(self) -> None:
+        for i in range(len(self.cases)):
+            c = self.cases[i]
+            if i>0: self.wait_for_led_chain_idle()
+            self.verbose.info("Warm start case %s"%(c.__name__))
+            self.golden_frames = c.golden_frames
+            self.reset_led_chain_model(c.__name__)
+            self.run_led_values(c.led_values)
+            if c.golden_frames: self.golden_check(c)
+            pass
+        pass
+    pass
+
+#v warm_start_attributes - attributes of a test case that a warm start group runs with
+warm_start_attributes = ["cfg_divider_400ns", "chain_length", "led_values", "golden_frames"]
+
+#f warm_start_tests
+def warm_start_tests(cases):
+    """
+    Group (test class, cycles) pairs by warm start key, and return
+    '_tests' entries with one test per group; each runs all the cases
+    of the group after a single reset and configuration.
+
+    A case may only differ from LedChainTest_Base in its warm start
+    attributes, as nothing else of the case is used by the group.
+    """
+    groups = {}
+    for (case, cycles) in cases:
+        for c in case.__mro__[:case.__mro__.index(LedChainTest_Base)]:
+            for (name, value) in c.__dict__.items():
+                if name.startswith("__") or (name in warm_start_attributes): continue
+                overrides = callable(value) or isinstance(value, (classmethod, staticmethod)) or hasattr(LedChainTest_Base, name)
+                assert not overrides, "Test case %s overrides '%s' so cannot be run in a warm start group"%(case.__name__, name)
+                pass
+            pass
+        key = case.warm_start_key()
+        if key not in groups: groups[key] = ([], 0)
+        (group_cases, group_cycles) = groups[key]
+        groups[key] = (group_cases+[case], group_cycles+cycles)
+        pass
+    tests = {}
+    for (key, (group_cases, cycles)) in groups.items():
+        th = type("LedChainTest_WarmStart_%d_%d"%key, (LedChainTest_WarmStart,),
+                  {"cfg_divider_400ns":key[0],
+                   "chain_length":key[1],
+                   "cases":group_cases})
+        tests["warm_%d_%d"%key] = (th, cycles, {})
+        pass
+    return tests
+
+#a Combinatorial sweep classes
+#c SweepLogParser - log event parser for sweep testbenches logging every vector
+class SweepLogParser(LogEventParser):
+    def filter_module(self, module_name:str) -> bool : return True
+    def map_log_type(self, log_type:str) -> Optional[str] :
+        if log_type in self.attr_map: return log_type
+        return None
+    attr_map = {"vector":{"stimulus":1, "response":2}}
+    pass
+
+#f sweep_signature
+def sweep_signature(responses) -> int:
+    """
+    Signature of a sequence of responses as accumulated by a sweep
+    testbench: a 32-bit multiple input signature register with the
+    CRC-32 polynomial
+    """
+    signature = 0
+    for r in responses:
+        feedback = (signature>>31) & 1
+        signature = (signature<<1) & 0xffffffff
+        if feedback: signature ^= 0x04c11db7
+        signature ^= r
+        pass
+    return signature
+
+#c CombSweepTest_Base
+class CombSweepTest_Base(ThExecFile):
+    """
+    Exhaustive test of a combinatorial module, using a sweep testbench
+    that presents every input vector to the DUT (one per clock) and
+    accumulates the responses into a signature.
+
+    The expected signature is computed once from the Python model; the
+    harness then waits only for the end of the sweep, and checks the
+    number of vectors and the signature with a single read of each.
+    Only if the signature mismatches is the sweep rerun with every
+    vector logged, to report the vectors that are wrong.
+
+    Subclasses provide 'stimulus_width' (which must match the
+    testbench) and 'model'.
+    """
+    th_name = "Combinatorial sweep test harness"
+    sweep_log_module = "dut"
+    #f run__init
+    def run__init(self) -> None:
+        self.expected_signature = sweep_signature(self.model(s) for s in range(1<<self.stimulus_width))
+        self.log_data        = self.log_recorder(self.sweep_log_module)
+        self.log_data_parser = SweepLogParser()
+        self.bfm_wait(1)
+        pass
+    #f sweep
+    def sweep(self, log:bool) -> None:
+        self.sweep_log.drive(int(log))
+        self.sweep_start.drive(1)
+        self.bfm_wait(1)
+        self.sweep_start.drive(0)
+        self.sweep_log.drive(0)
+        self.bfm_wait(1)
+        self.sweep_done.wait_for_value(1)
+        pass
+    #f report_mismatches
+    def report_mismatches(self) -> None:
+        """
+        Rerun the sweep logging every vector, and report the vectors
+        whose response differs from the model
+        """
+        self.sweep(log=True)
+        mismatches = []
+        while self.log_data.num_events()>0:
+            l = self.log_data_parser.parse_log_event(self.log_data.event_pop())
+            if l is None: continue
+            expected = self.model(l.stimulus)
+            if l.response!=expected: mismatches.append((l.stimulus, l.response, expected))
+            pass
+        for (stimulus, response, expected) in mismatches[:8]:
+            self.verbose.error("Stimulus %x gave response %x expected %x"%(stimulus, response, expected))
+            pass
+        if mismatches!=[]:
+            (stimulus, response, expected) = mismatches[0]
+            self.failtest("%d vectors mismatch; first is stimulus %x, response %x expected %x"%(len(mismatches), stimulus, response, expected))
+            pass
+        pass
+    #f run
+    def run(self) -> None:
+        self.sweep(log=False)
+        self.compare_expected("number of vectors in sweep", self.sweep_vectors.value(), 1<<self.stimulus_width)
+        signature = self.sweep_signature.value()
+        self.compare_expected("signature of sweep", signature, self.expected_signature)
+        if signature!=self.expected_signature: self.report_mismatches()
+        pass
+    #f run__finalize
+    def run__finalize(self) -> None:
+        self.passtest("Test completed")
+        pass
+    pass
+
+#c LedSevenSegmentTest_0
+class LedSevenSegmentTest_0(CombSweepTest_Base):
+    stimulus_width = 4
+    def model(self, stimulus:int) -> int: return led_seven_segment(stimulus)
+    pass
+
 #a Hardware and test instantiation
 #c ApbTargetLedChainHardware
 class ApbTargetLedChainHardware(HardwareThDut):
@@ -353,15 +670,43 @@ class TestLedChain(TestCase):
     hw = LedChainHardware
     _tests = {"0": (LedChainTest_0, 8*1000,   {}),
               "1": (LedChainTest_1, 110*1000, {}),
-              "2": (LedChainTest_2, 30*1000,  {}),
               "3": (LedChainTest_3, 50*1000,  {}),
     }
+    _tests.update(golden_tests("5", LedChainTest_5, len(LedChainTest_5.led_values)*4*1000, apb=False))
+    _tests.update(warm_start_tests([(LedChainTest_2, 30*1000),
+                                        (LedChainTest_4, 30*1000),
+    ]))
 
 #c TestApbLedChain
 class TestApbLedChain(TestCase):
     hw = ApbTargetLedChainHardware
     _tests = {"0": (LedChainTest_0, 10*1000,  {}),
               "1": (LedChainTest_1, 160*1000, {}),
-              "2": (LedChainTest_2,  70*1000, {}),
               "3": (LedChainTest_3,  60*1000, {}),
     }
+    _tests.update(golden_tests("5", LedChainTest_5, len(LedChainTest_5.led_values)*6*1000, apb=True))
+    _tests.update(warm_start_tests([(LedChainTest_2, 70*1000),
+                                        (LedChainTest_4, 70*1000),
+    ]))
+
+#c LedSevenSegmentHardware
+class LedSevenSegmentHardware(HardwareThDut):
+    clock_desc = [("clk",(0,1,1))]
+    reset_desc = {"name":"reset_n", "init_value":0, "wait":5}
+    module_name = "tb_led_seven_segment"
+    dut_inputs  = {"sweep_start":1,
+                   "sweep_log":1,
+    }
+    dut_outputs = {"sweep_done":1,
+                   "sweep_vectors":32,
+                   "sweep_signature":32,
+    }
+    loggers = {
+                }
+    pass
+
+#c TestLedSevenSegment
+class TestLedSevenSegment(TestCase):
+    hw = LedSevenSegmentHardware
+    _tests = {"0": (LedSevenSegmentTest_0, 1*1000, {}),
+    }